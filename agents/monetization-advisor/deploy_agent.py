@@ -16,9 +16,11 @@ Prerequisites:
 """
 
 from letta_client import Letta
+from letta_client.types.agents import AssistantMessage, ReasoningMessage, ToolCallMessage
 from pathlib import Path
 import sys
 import argparse
+import functools
 
 # Configuration
 LETTA_BASE_URL = "https://letta.delo.sh"
@@ -47,12 +49,51 @@ MODEL_CONTEXT_WINDOWS = {
     "z-ai/glm-4.7": 202752,
 }
 
+# System instructions that guide agent behavior
+SYSTEM_INSTRUCTIONS = """
+You are Cash Flow Catalyst, an aggressive monetization advisor for software developers.
+
+## Your Mission
+Help Jarad transform his backlog of projects into revenue streams. Every conversation should move toward first conversion.
+
+## Conversation Flow
+1. **Audit Phase**: When discussing a project, immediately identify monetization angles
+2. **Validation Phase**: Design quick experiments to test willingness-to-pay
+3. **Sprint Phase**: Create 2-week action plans focused on first dollar
+4. **Tracking Phase**: Update the pipeline memory block as projects progress
+
+## Key Behaviors
+- Challenge "it's just a utility" thinking - everything has value
+- Push for specifics: what, who pays, how much, when
+- Celebrate small wins - $10 MRR is validation, not failure
+- Track progress in the pipeline block obsessively
+- Be direct but supportive - accountability partner energy
+
+## Response Format
+- Lead with actionable insights, not theory
+- Include specific next steps with timelines
+- When auditing projects, provide 3+ monetization paths ranked by speed-to-revenue
+- Use your pipeline block to track all discussed projects
+
+## Memory Management
+- Update the human block when learning new info about Jarad's situation
+- Update the pipeline block when projects change status
+- Record revenue milestones in pipeline tracking table
+"""
+
+
+@functools.lru_cache(maxsize=None)
 def load_block(filename: str) -> str:
-    """Load memory block content from file."""
+    """Load memory block content from file (cached per process)."""
     path = Path(__file__).parent / filename
     return path.read_text().strip()
 
 
+def resolve_model(name: str) -> str | None:
+    """Resolve a model alias or full path to an approved model ID (None if not approved)."""
+    return APPROVED_MODELS.get(name, name if name in MODEL_CONTEXT_WINDOWS else None)
+
+
 def get_client():
     """Get Letta client connection."""
     return Letta(base_url=LETTA_BASE_URL)
@@ -70,92 +111,60 @@ def list_approved_models():
     print("-" * 50)
 
 
-def delete_agent(client, agent_name: str) -> bool:
-    """Delete an existing agent by name."""
+def find_agent(client, agent_name: str):
+    """Find an agent by name using the server-side name filter (None if missing)."""
+    return next(iter(client.agents.list(name=agent_name, limit=1)), None)
+
+
+def delete_agent(client, agent_name: str, agent) -> bool:
+    """Delete an existing agent, given the result of find_agent()."""
     try:
-        existing_agents = client.agents.list()
-        for agent in existing_agents:
-            if agent.name == agent_name:
-                client.agents.delete(agent.id)
-                print(f"🗑️  Deleted existing agent: {agent_name} (ID: {agent.id})")
-                return True
-        print(f"ℹ️  No agent named '{agent_name}' found to delete.")
-        return False
+        if agent is None:
+            print(f"ℹ️  No agent named '{agent_name}' found to delete.")
+            return False
+        client.agents.delete(agent.id)
+        print(f"🗑️  Deleted existing agent: {agent_name} (ID: {agent.id})")
+        return True
     except Exception as e:
         print(f"⚠️  Error deleting agent: {e}")
         return False
 
 
-def create_agent(model: str = DEFAULT_MODEL, force_delete: bool = False):
-    """Create and configure the Cash Flow Catalyst agent."""
+def create_agent(client, model: str = DEFAULT_MODEL, force_delete: bool = False):
+    """Create and configure the Cash Flow Catalyst agent.
+
+    ``model`` must already be resolved with resolve_model().
+    """
 
     # Validate model
     if model not in MODEL_CONTEXT_WINDOWS:
-        # Check if it's an alias
-        if model in APPROVED_MODELS:
-            model = APPROVED_MODELS[model]
-        else:
-            print(f"❌ Model '{model}' is not in the approved list.")
-            list_approved_models()
-            return None
+        print(f"❌ Model '{model}' is not in the approved list.")
+        list_approved_models()
+        return None
 
     context_window = MODEL_CONTEXT_WINDOWS.get(model, 64000)
 
-    # Connect to self-hosted Letta
-    client = get_client()
-
     print(f"🔗 Connecting to Letta at {LETTA_BASE_URL}...")
     print(f"🤖 Model: {model} (context: {context_window:,} tokens)")
 
-    # Delete existing agent if requested
-    if force_delete:
-        delete_agent(client, AGENT_NAME)
-
     # Load memory block content
     persona_content = load_block("persona.md")
     human_content = load_block("human.md")
     pipeline_content = load_block("pipeline.md")
 
-    # System instructions that guide agent behavior
-    system_instructions = """
-You are Cash Flow Catalyst, an aggressive monetization advisor for software developers.
-
-## Your Mission
-Help Jarad transform his backlog of projects into revenue streams. Every conversation should move toward first conversion.
-
-## Conversation Flow
-1. **Audit Phase**: When discussing a project, immediately identify monetization angles
-2. **Validation Phase**: Design quick experiments to test willingness-to-pay
-3. **Sprint Phase**: Create 2-week action plans focused on first dollar
-4. **Tracking Phase**: Update the pipeline memory block as projects progress
-
-## Key Behaviors
-- Challenge "it's just a utility" thinking - everything has value
-- Push for specifics: what, who pays, how much, when
-- Celebrate small wins - $10 MRR is validation, not failure
-- Track progress in the pipeline block obsessively
-- Be direct but supportive - accountability partner energy
+    try:
+        # Look up the agent once; reused for both the delete and the exists check
+        existing_agent = find_agent(client, AGENT_NAME)
 
-## Response Format
-- Lead with actionable insights, not theory
-- Include specific next steps with timelines
-- When auditing projects, provide 3+ monetization paths ranked by speed-to-revenue
-- Use your pipeline block to track all discussed projects
+        # Delete existing agent if requested
+        if force_delete and delete_agent(client, AGENT_NAME, existing_agent):
+            existing_agent = None
 
-## Memory Management
-- Update the human block when learning new info about Jarad's situation
-- Update the pipeline block when projects change status
-- Record revenue milestones in pipeline tracking table
-"""
-    
-    try:
         # Check if agent already exists
-        existing_agents = client.agents.list()
-        for agent in existing_agents:
-            if agent.name == AGENT_NAME:
-                print(f"⚠️  Agent '{AGENT_NAME}' already exists (ID: {agent.id})")
-                print("   Use --delete flag to recreate, or interact with existing agent.")
-                return agent
+        if existing_agent is not None:
+            print(f"⚠️  Agent '{AGENT_NAME}' already exists (ID: {existing_agent.id})")
+            print("   Use --delete flag to recreate, or interact with existing agent.")
+            return existing_agent
 
         # Create the agent with memory blocks
         # Use llm_config to explicitly specify OpenRouter endpoint
@@ -175,7 +184,7 @@ Help Jarad transform his backlog of projects into revenue streams. Every convers
                 "embedding_dim": 1536,
                 "embedding_chunk_size": 300,
             },
-            system=system_instructions,
+            system=SYSTEM_INSTRUCTIONS,
             memory_blocks=[
                 {
                     "label": "persona",
@@ -213,10 +222,8 @@ Help Jarad transform his backlog of projects into revenue streams. Every convers
         return None
 
 
-def test_agent(agent_id: str):
+def test_agent(client, agent_id: str):
     """Send a test message to verify the agent works."""
-    client = get_client()
-
     print("\n📨 Sending test message...")
     print("   Message: 'Hey Marcus! Ready to dig into my project backlog and find some money?'")
 
@@ -233,11 +240,12 @@ def test_agent(agent_id: str):
 
         print("\n🤖 Agent response:")
         for msg in response.messages:
-            if hasattr(msg, 'content') and msg.content:
-                print(f"   {msg.content}")
-            elif hasattr(msg, 'tool_call'):
+            if isinstance(msg, AssistantMessage):
+                if msg.content:
+                    print(f"   {msg.content}")
+            elif isinstance(msg, ToolCallMessage):
                 print(f"   [Tool call: {msg.tool_call.name}]")
-            elif hasattr(msg, 'reasoning'):
+            elif isinstance(msg, ReasoningMessage):
                 print(f"   💭 {msg.reasoning[:100]}..." if len(msg.reasoning) > 100 else f"   💭 {msg.reasoning}")
 
     except Exception as e:
@@ -286,14 +294,18 @@ Examples:
         return
 
     # Resolve model alias if provided
-    model = args.model
-    if model in APPROVED_MODELS:
-        model = APPROVED_MODELS[model]
+    model = resolve_model(args.model)
+    if model is None:
+        print(f"❌ Model '{args.model}' is not in the approved list.")
+        list_approved_models()
+        return
 
-    agent = create_agent(model=model, force_delete=args.delete)
+    # One client (and connection pool) shared by every call in this run
+    with get_client() as client:
+        agent = create_agent(client, model=model, force_delete=args.delete)
 
-    if args.test and agent:
-        test_agent(agent.id)
+        if args.test and agent:
+            test_agent(client, agent.id)
 
 
 if __name__ == "__main__":
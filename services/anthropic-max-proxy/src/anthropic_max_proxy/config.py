@@ -33,14 +33,19 @@ class Settings(BaseSettings):
 
     # Token storage
     token_file: Path = Field(
-        default=Path.home() / ".config" / "anthropic-max-proxy" / "tokens.json",
+        default_factory=lambda: Path.home() / ".config" / "anthropic-max-proxy" / "tokens.json",
         description="Path to store OAuth tokens",
     )
 
+    # Response cache for deterministic (temperature=0, non-streaming) requests
+    response_cache_size: int = Field(
+        default=1024, description="Max cached chat completions (0 disables the cache)"
+    )
+
     # Logging
     log_level: str = Field(default="INFO", description="Logging level")
 
-    model_config = {"env_prefix": "ANTHROPIC_PROXY_"}
+    model_config = {"env_prefix": "ANTHROPIC_PROXY_", "frozen": True, "validate_default": False}
 
 
 settings = Settings()
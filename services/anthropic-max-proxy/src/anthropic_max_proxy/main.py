@@ -1,19 +1,28 @@
 """FastAPI application for Anthropic MAX OAuth proxy."""
 
+import asyncio
+import hashlib
+import importlib.util
 import json
 import logging
-from contextlib import asynccontextmanager
+import sys
+import time
+from contextlib import asynccontextmanager, suppress
 
 import httpx
+import orjson
 import uvicorn
+from cachetools import LRUCache
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 
 from .config import settings
+from .oauth import close_client as close_oauth_client
 from .oauth import token_manager
 from .translator import (
     MODEL_MAP,
-    anthropic_stream_to_openai_stream,
+    STREAM_OUTPUT_EVENTS,
+    anthropic_stream_to_openai_stream_bytes,
     anthropic_to_openai_response,
     openai_to_anthropic_request,
     translate_model,
@@ -29,21 +38,52 @@ ANTHROPIC_BETAS = [
     "claude-code-20250219",
     "interleaved-thinking-2025-05-14",
     "fine-grained-tool-streaming-2025-05-14",
+    "prompt-caching-2024-07-31",
 ]
+ANTHROPIC_BETA_HEADER = ",".join(ANTHROPIC_BETAS)
+
+# Static headers for Anthropic; Authorization is added per request
+ANTHROPIC_BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "anthropic-version": "2023-06-01",
+    "anthropic-beta": ANTHROPIC_BETA_HEADER,
+}
+
+# Max upstream reads (as translated SSE batches) buffered ahead of the client
+STREAM_QUEUE_SIZE = 64
+
+# Requests with more messages than this are translated off the event loop
+OFFLOAD_TRANSLATION_MESSAGES = 32
+
+# Encoded OpenAI responses for deterministic (temperature=0, non-streaming) requests
+RESPONSE_CACHE: LRUCache[bytes, bytes] = LRUCache(maxsize=settings.response_cache_size)
+_response_cache_stats = {"hits": 0, "misses": 0}
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
-    # Check auth status on startup
-    if token_manager.is_authenticated():
+    # Load tokens once on startup; later checks are served from memory
+    if token_manager.load():
         logger.info("Anthropic MAX OAuth tokens loaded")
     else:
         logger.warning(
             "No Anthropic MAX tokens found. "
             "Visit /auth/start to begin OAuth flow."
         )
-    yield
+
+    # Shared client so upstream connections (TCP + TLS) are reused across requests
+    app.state.http = httpx.AsyncClient(
+        base_url=settings.anthropic_api_url,
+        timeout=httpx.Timeout(120.0, connect=5.0),
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        await close_oauth_client()
 
 
 app = FastAPI(
@@ -63,9 +103,17 @@ app = FastAPI(
 @app.get("/v1/health")
 async def health():
     """Health check endpoint."""
+    hits = _response_cache_stats["hits"]
+    lookups = hits + _response_cache_stats["misses"]
     return {
         "status": "ok",
         "authenticated": token_manager.is_authenticated(),
+        "response_cache": {
+            "size": RESPONSE_CACHE.currsize,
+            "hits": hits,
+            "misses": _response_cache_stats["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+        },
     }
 
 
@@ -120,7 +168,7 @@ async def auth_callback(request: Request):
 @app.post("/auth/logout")
 async def auth_logout():
     """Clear stored tokens."""
-    token_manager.clear()
+    await token_manager.clear()
     return {"status": "success", "message": "Tokens cleared"}
 
 
@@ -129,20 +177,26 @@ async def auth_logout():
 # ============================================================================
 
 
-@app.get("/v1/models")
-async def list_models():
-    """List available models (OpenAI format)."""
-    models = []
-    for openai_name, anthropic_id in MODEL_MAP.items():
-        models.append({
+# MODEL_MAP is static, so the /v1/models body is encoded once at import
+_MODELS_PAYLOAD = orjson.dumps({
+    "object": "list",
+    "data": [
+        {
             "id": openai_name,
             "object": "model",
             "created": 1700000000,
             "owned_by": "anthropic",
             "anthropic_id": anthropic_id,
-        })
+        }
+        for openai_name, anthropic_id in MODEL_MAP.items()
+    ],
+})
 
-    return {"object": "list", "data": models}
+
+@app.get("/v1/models")
+async def list_models():
+    """List available models (OpenAI format)."""
+    return Response(content=_MODELS_PAYLOAD, media_type="application/json")
 
 
 @app.post("/v1/chat/completions")
@@ -161,93 +215,120 @@ async def chat_completions(request: Request):
 
     # Parse OpenAI request
     openai_request = await request.json()
-    logger.debug(f"OpenAI request: {json.dumps(openai_request, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("OpenAI request: %s", json.dumps(openai_request))
 
-    # Translate to Anthropic format
-    anthropic_request = openai_to_anthropic_request(openai_request)
+    # Translate to Anthropic format (long conversations in a worker thread)
+    if len(openai_request.get("messages", [])) > OFFLOAD_TRANSLATION_MESSAGES:
+        anthropic_request = await asyncio.to_thread(openai_to_anthropic_request, openai_request)
+    else:
+        anthropic_request = openai_to_anthropic_request(openai_request)
     original_model = openai_request.get("model", "")
-    logger.debug(f"Anthropic request: {json.dumps(anthropic_request, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Anthropic request: %s", json.dumps(anthropic_request))
+
+    # Serve repeated deterministic requests from the response cache
+    cache_key = None
+    deterministic = openai_request.get("temperature", 1) == 0 and not openai_request.get("stream")
+    if deterministic and settings.response_cache_size:
+        cache_key = _response_cache_key(anthropic_request, original_model)
+        cached = RESPONSE_CACHE.get(cache_key)
+        if cached is not None:
+            _response_cache_stats["hits"] += 1
+            return Response(content=cached, media_type="application/json")
+        _response_cache_stats["misses"] += 1
 
     # Build headers for Anthropic
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-        "anthropic-version": "2023-06-01",
-        "anthropic-beta": ",".join(ANTHROPIC_BETAS),
-    }
+    headers = {**ANTHROPIC_BASE_HEADERS, "Authorization": f"Bearer {access_token}"}
 
     # Handle streaming vs non-streaming
+    client = request.app.state.http
     if openai_request.get("stream"):
-        return await _handle_streaming(anthropic_request, headers, original_model)
+        return await _handle_streaming(client, anthropic_request, headers, original_model)
     else:
-        return await _handle_non_streaming(anthropic_request, headers, original_model)
+        return await _handle_non_streaming(
+            client, anthropic_request, headers, original_model, cache_key
+        )
+
+
+def _response_cache_key(anthropic_request: dict, original_model: str) -> bytes:
+    """Hash the canonicalized request (the echoed model name is part of the response)."""
+    canonical = orjson.dumps([original_model, anthropic_request], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(canonical).digest()
 
 
 async def _handle_non_streaming(
-    anthropic_request: dict, headers: dict, original_model: str
-) -> JSONResponse:
-    """Handle non-streaming request."""
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(
-            f"{settings.anthropic_api_url}/messages",
-            json=anthropic_request,
-            headers=headers,
+    client: httpx.AsyncClient,
+    anthropic_request: dict,
+    headers: dict,
+    original_model: str,
+    cache_key: bytes | None = None,
+) -> Response:
+    """Handle non-streaming request, storing the result under ``cache_key`` if given."""
+    response = await client.post("/messages", json=anthropic_request, headers=headers)
+
+    if not response.is_success:
+        # Pass the upstream error body through untouched (no re-encoding)
+        logger.error(
+            "Anthropic error: %s (%d bytes)", response.status_code, len(response.content)
+        )
+        return Response(
+            status_code=response.status_code,
+            content=response.content,
+            media_type=response.headers.get("content-type", "application/json"),
         )
 
-        if not response.is_success:
-            logger.error(f"Anthropic error: {response.status_code} - {response.text}")
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Anthropic API error: {response.text}",
-            )
-
-        anthropic_response = response.json()
-        logger.debug(f"Anthropic response: {json.dumps(anthropic_response, indent=2)}")
+    anthropic_response = response.json()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Anthropic response: %s", json.dumps(anthropic_response))
+        usage = anthropic_response.get("usage", {})
+        logger.debug(
+            "Prompt cache: read=%s created=%s",
+            usage.get("cache_read_input_tokens", 0),
+            usage.get("cache_creation_input_tokens", 0),
+        )
 
-        # Translate back to OpenAI format
-        openai_response = anthropic_to_openai_response(anthropic_response, original_model)
-        return JSONResponse(content=openai_response)
+    # Translate back to OpenAI format
+    openai_response = anthropic_to_openai_response(anthropic_response, original_model)
+    content = orjson.dumps(openai_response)
+    if cache_key is not None:
+        RESPONSE_CACHE[cache_key] = content
+    return Response(content=content, media_type="application/json")
 
 
 async def _handle_streaming(
-    anthropic_request: dict, headers: dict, original_model: str
+    client: httpx.AsyncClient, anthropic_request: dict, headers: dict, original_model: str
 ) -> StreamingResponse:
     """Handle streaming request."""
+    # Resolved once per stream; every chunk echoes this same (interned) name
+    stream_model = sys.intern(original_model)
 
     async def generate():
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            async with client.stream(
-                "POST",
-                f"{settings.anthropic_api_url}/messages",
-                json=anthropic_request,
-                headers=headers,
-            ) as response:
-                if not response.is_success:
-                    error_text = await response.aread()
-                    logger.error(f"Anthropic stream error: {response.status_code} - {error_text}")
-                    yield f"data: {json.dumps({'error': error_text.decode()})}\n\n"
-                    return
-
-                async for line in response.aiter_lines():
-                    if not line:
-                        continue
-
-                    # Parse SSE format
-                    if line.startswith("event: "):
-                        event_type = line[7:]
-                    elif line.startswith("data: "):
-                        try:
-                            data = json.loads(line[6:])
-                            openai_chunk = anthropic_stream_to_openai_stream(
-                                event_type, data, original_model
-                            )
-                            if openai_chunk:
-                                yield f"data: {json.dumps(openai_chunk)}\n\n"
-                        except json.JSONDecodeError:
-                            continue
-
-                # Send [DONE] marker
-                yield "data: [DONE]\n\n"
+        async with client.stream(
+            "POST", "/messages", json=anthropic_request, headers=headers
+        ) as response:
+            if not response.is_success:
+                error_text = await response.aread()
+                logger.error(f"Anthropic stream error: {response.status_code} - {error_text}")
+                yield b"data: " + orjson.dumps({"error": error_text.decode()}) + b"\n\n"
+                return
+
+            # Read upstream in a background task so a slow client doesn't stall it
+            queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+            created = int(time.time())
+            producer = asyncio.create_task(_pump(response, queue, stream_model, created))
+            try:
+                while (item := await queue.get()) is not None:
+                    yield item
+                # Surface any upstream read error
+                await producer
+            finally:
+                producer.cancel()
+                with suppress(asyncio.CancelledError):
+                    await producer
+
+            # Send [DONE] marker
+            yield b"data: [DONE]\n\n"
 
     return StreamingResponse(
         generate(),
@@ -259,6 +340,63 @@ async def _handle_streaming(
     )
 
 
+async def _iter_sse_line_batches(response: httpx.Response):
+    """Yield the complete raw lines of each upstream read as one list.
+
+    A trailing partial line is carried over to the next read; whatever is left when
+    the stream ends is flushed as a final batch.
+    """
+    buf = b""
+    async for chunk in response.aiter_bytes():
+        lines = (buf + chunk).split(b"\n")
+        buf = lines.pop()
+        yield lines
+    if buf:
+        yield [buf]
+
+
+async def _pump(
+    response: httpx.Response,
+    queue: asyncio.Queue[bytes | None],
+    original_model: str,
+    created: int,
+) -> None:
+    """Translate the upstream SSE stream into framed OpenAI SSE bytes on the queue.
+
+    All frames translated from one upstream read are queued as a single payload.
+    Puts ``None`` once the stream is exhausted (or has failed) to wake the consumer.
+    """
+    try:
+        event_type = ""
+        async for lines in _iter_sse_line_batches(response):
+            out = bytearray()
+            for line in lines:
+                line = line.rstrip(b"\r")
+                if not line:
+                    continue
+
+                # Parse SSE format
+                if line.startswith(b"event: "):
+                    event_type = line[7:].decode()
+                elif line.startswith(b"data: ") and event_type in STREAM_OUTPUT_EVENTS:
+                    try:
+                        data = orjson.loads(line[6:])
+                        frame = anthropic_stream_to_openai_stream_bytes(
+                            event_type, data, original_model, created
+                        )
+                        if frame:
+                            out += frame
+                    except orjson.JSONDecodeError:
+                        continue
+
+            if out:
+                await queue.put(bytes(out))
+    except Exception:
+        await queue.put(None)
+        raise
+    await queue.put(None)
+
+
 # ============================================================================
 # Entry Point
 # ============================================================================
@@ -272,6 +410,9 @@ def run():
         port=settings.port,
         reload=False,
         log_level=settings.log_level.lower(),
+        # uvloop is not available on Windows; uvicorn[standard] skips it there
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "auto",
+        http="httptools",
     )
 
 
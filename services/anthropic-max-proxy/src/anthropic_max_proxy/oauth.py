@@ -1,19 +1,33 @@
 """OAuth 2.0 PKCE flow for Anthropic MAX subscription."""
 
+import asyncio
 import base64
 import hashlib
 import json
+import logging
+import os
 import secrets
+import tempfile
 import time
 from dataclasses import dataclass
 from pathlib import Path
+from urllib.parse import quote, urlencode
 
 import httpx
+import orjson
 
 from .config import settings
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+# Min seconds between background writes of tokens whose refresh_token didn't change
+PERSIST_INTERVAL_SECONDS = 300
+
+# Shared client for token endpoint calls, created lazily so keep-alive spans refreshes
+_client: httpx.AsyncClient | None = None
+
+
+@dataclass(slots=True, frozen=True)
 class PKCEChallenge:
     """PKCE challenge/verifier pair."""
 
@@ -21,7 +35,7 @@ class PKCEChallenge:
     challenge: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class OAuthTokens:
     """OAuth token storage."""
 
@@ -51,12 +65,14 @@ class OAuthTokens:
 
 def generate_pkce() -> PKCEChallenge:
     """Generate PKCE verifier and challenge."""
-    # 32 bytes = 256 bits of entropy
-    verifier = secrets.token_urlsafe(32)
+    # 32 bytes = 256 bits of entropy, base64url encoded (no padding)
+    verifier_bytes = base64.urlsafe_b64encode(secrets.token_bytes(32)).rstrip(b"=")
+    verifier = verifier_bytes.decode("ascii")
 
-    # SHA256 hash, base64url encoded (no padding)
-    digest = hashlib.sha256(verifier.encode()).digest()
-    challenge = base64.urlsafe_b64encode(digest).decode().rstrip("=")
+    # SHA256 hash of the verifier, base64url encoded (no padding); hashlib uses
+    # OpenSSL, which picks SHA-NI instructions where the CPU has them
+    digest = hashlib.sha256(verifier_bytes).digest()
+    challenge = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
 
     return PKCEChallenge(verifier=verifier, challenge=challenge)
 
@@ -74,8 +90,27 @@ def build_auth_url(pkce: PKCEChallenge) -> str:
         "state": pkce.verifier,  # Store verifier in state for later use
     }
 
-    query = "&".join(f"{k}={v}" for k, v in params.items())
-    return f"{settings.anthropic_oauth_url}?{query}"
+    return f"{settings.anthropic_oauth_url}?{urlencode(params, quote_via=quote)}"
+
+
+async def _get_client() -> httpx.AsyncClient:
+    """Return the shared OAuth HTTP client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300),
+            timeout=httpx.Timeout(30.0),
+            http2=True,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared OAuth HTTP client (call on shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
 
 
 async def exchange_code(code: str, verifier: str) -> OAuthTokens | None:
@@ -85,53 +120,59 @@ async def exchange_code(code: str, verifier: str) -> OAuthTokens | None:
     actual_code = splits[0]
     state = splits[1] if len(splits) > 1 else ""
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.anthropic_token_url,
-            json={
-                "code": actual_code,
-                "state": state,
-                "grant_type": "authorization_code",
-                "client_id": settings.anthropic_client_id,
-                "redirect_uri": "https://console.anthropic.com/oauth/code/callback",
-                "code_verifier": verifier,
-            },
-            headers={"Content-Type": "application/json"},
-        )
-
-        if not response.is_success:
-            return None
+    client = await _get_client()
+    response = await client.post(
+        settings.anthropic_token_url,
+        json={
+            "code": actual_code,
+            "state": state,
+            "grant_type": "authorization_code",
+            "client_id": settings.anthropic_client_id,
+            "redirect_uri": "https://console.anthropic.com/oauth/code/callback",
+            "code_verifier": verifier,
+        },
+        headers={"Content-Type": "application/json"},
+    )
+
+    if not response.is_success:
+        return None
 
-        data = response.json()
-        return OAuthTokens(
-            access_token=data["access_token"],
-            refresh_token=data["refresh_token"],
-            expires_at=time.time() + data["expires_in"],
-        )
+    data = response.json()
+    return OAuthTokens(
+        access_token=data["access_token"],
+        refresh_token=data["refresh_token"],
+        expires_at=time.time() + data["expires_in"],
+    )
 
 
 async def refresh_tokens(refresh_token: str) -> OAuthTokens | None:
     """Refresh access token using refresh token."""
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.anthropic_token_url,
-            json={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": settings.anthropic_client_id,
-            },
-            headers={"Content-Type": "application/json"},
-        )
+    client = await _get_client()
+    response = await client.post(
+        settings.anthropic_token_url,
+        json={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": settings.anthropic_client_id,
+        },
+        headers={"Content-Type": "application/json"},
+    )
+
+    if not response.is_success:
+        return None
 
-        if not response.is_success:
-            return None
+    data = response.json()
+    return OAuthTokens(
+        access_token=data["access_token"],
+        refresh_token=data["refresh_token"],
+        expires_at=time.time() + data["expires_in"],
+    )
 
-        data = response.json()
-        return OAuthTokens(
-            access_token=data["access_token"],
-            refresh_token=data["refresh_token"],
-            expires_at=time.time() + data["expires_in"],
-        )
+
+def _log_persist_failure(task: asyncio.Task) -> None:
+    """Done-callback for background token writes, which nothing else awaits."""
+    if not task.cancelled() and (exc := task.exception()):
+        logger.error("Background token persist failed", exc_info=exc)
 
 
 class TokenManager:
@@ -140,39 +181,106 @@ class TokenManager:
     def __init__(self, token_file: Path | None = None):
         self.token_file = token_file or settings.token_file
         self._tokens: OAuthTokens | None = None
+        self._loaded = False  # True once disk has been read; later state is kept in memory
         self._pkce: PKCEChallenge | None = None
+        # Hot-path cache of the current access token and its expiry
+        self._cached_access: str | None = None
+        self._cached_exp: float = 0.0
+        # Only one coroutine refreshes at a time; the rest reuse its result
+        self._refresh_lock = asyncio.Lock()
+        # Serializes every token-file write and unlink, so a stale write can't land
+        # after a newer one or resurrect the file after logout
+        self._io_lock = asyncio.Lock()
+        # Debounced background persistence of access-token-only refreshes
+        self._last_persist = 0.0
+        self._persist_task: asyncio.Task | None = None
 
     def _ensure_dir(self) -> None:
         """Ensure token directory exists."""
         self.token_file.parent.mkdir(parents=True, exist_ok=True)
 
     def load(self) -> OAuthTokens | None:
-        """Load tokens from file."""
-        if self._tokens:
+        """Load tokens, reading the file only on first use."""
+        if self._loaded:
             return self._tokens
 
-        if self.token_file.exists():
-            try:
-                data = json.loads(self.token_file.read_text())
-                self._tokens = OAuthTokens.from_dict(data)
-                return self._tokens
-            except (json.JSONDecodeError, KeyError):
-                return None
-        return None
+        try:
+            data = json.loads(self.token_file.read_text())
+            self._tokens = OAuthTokens.from_dict(data)
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self._tokens = None
+        except OSError as e:
+            # Leave _loaded unset so the read is retried on the next call
+            logger.warning("Could not read token file %s: %s", self.token_file, e)
+            return None
+        self._loaded = True
+        return self._tokens
 
-    def save(self, tokens: OAuthTokens) -> None:
-        """Save tokens to file."""
-        self._ensure_dir()
+    def _set(self, tokens: OAuthTokens) -> None:
+        """Replace the in-memory tokens."""
+        self.invalidate()
         self._tokens = tokens
-        self.token_file.write_text(json.dumps(tokens.to_dict(), indent=2))
-        # Restrict permissions
-        self.token_file.chmod(0o600)
+        self._loaded = True
+
+    async def save(self, tokens: OAuthTokens) -> None:
+        """Save tokens to memory and (atomically, owner-only) to file."""
+        self._set(tokens)
+        await self._persist(tokens)
+
+    def _write(self, tokens: OAuthTokens) -> None:
+        """Write tokens to file atomically, readable only by the owner (runs in a thread)."""
+        self._ensure_dir()
 
-    def clear(self) -> None:
+        # mkstemp creates a uniquely named 0600 file, so concurrent writers never share
+        # a temp path; renaming it over the real file means readers never see a partial
+        # write and permissions are never looser
+        fd, tmp = tempfile.mkstemp(
+            dir=self.token_file.parent, prefix=self.token_file.name + ".", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(orjson.dumps(tokens.to_dict(), option=orjson.OPT_INDENT_2))
+            os.replace(tmp, self.token_file)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    async def _persist(self, tokens: OAuthTokens) -> None:
+        """Write tokens to file unless they were replaced or cleared meanwhile."""
+        async with self._io_lock:
+            # Checked under the lock: a clear() or newer save() may have run while waiting
+            if self._tokens is tokens:
+                self._last_persist = time.monotonic()
+                await asyncio.to_thread(self._write, tokens)
+
+    def _schedule_persist(self) -> None:
+        """Persist the current tokens in the background, at most once per interval."""
+        if self._persist_task and not self._persist_task.done():
+            # The pending write picks up whatever tokens are current when it runs
+            return
+        delay = self._last_persist + PERSIST_INTERVAL_SECONDS - time.monotonic()
+        self._persist_task = asyncio.create_task(self._persist_after(delay))
+        self._persist_task.add_done_callback(_log_persist_failure)
+
+    async def _persist_after(self, delay: float) -> None:
+        """Wait out the debounce interval, then write the tokens current at that point."""
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._tokens is not None:
+            await self._persist(self._tokens)
+
+    async def clear(self) -> None:
         """Clear stored tokens."""
+        self.invalidate()
         self._tokens = None
-        if self.token_file.exists():
-            self.token_file.unlink()
+        self._loaded = True
+        async with self._io_lock:
+            await asyncio.to_thread(self.token_file.unlink, missing_ok=True)
+
+    def invalidate(self) -> None:
+        """Drop the cached access token so the next lookup re-checks stored tokens."""
+        self._cached_access = None
+        self._cached_exp = 0.0
 
     def start_auth_flow(self) -> tuple[str, str]:
         """Start OAuth flow, return (auth_url, verifier)."""
@@ -189,32 +297,51 @@ class TokenManager:
 
         tokens = await exchange_code(code, v)
         if tokens:
-            self.save(tokens)
+            await self.save(tokens)
             self._pkce = None
             return True
         return False
 
     async def get_valid_token(self) -> str | None:
         """Get valid access token, refreshing if needed."""
+        # Fast path: cached token outside the refresh buffer used by is_expired()
+        if self._cached_access and time.time() < self._cached_exp - 60:
+            return self._cached_access
+
         tokens = self.load()
         if not tokens:
             return None
 
         # Refresh if expired
         if tokens.is_expired():
-            new_tokens = await refresh_tokens(tokens.refresh_token)
-            if new_tokens:
-                self.save(new_tokens)
-                tokens = new_tokens
-            else:
-                # Refresh failed, need to re-auth
-                self.clear()
-                return None
-
+            async with self._refresh_lock:
+                # Re-check: another coroutine may have refreshed while we waited
+                tokens = self.load()
+                if not tokens:
+                    return None
+
+                if tokens.is_expired():
+                    new_tokens = await refresh_tokens(tokens.refresh_token)
+                    if new_tokens and new_tokens.refresh_token == tokens.refresh_token:
+                        # Only the access token rotated: the file still holds a usable
+                        # refresh token, so keep this in memory and persist lazily
+                        self._set(new_tokens)
+                        self._schedule_persist()
+                        tokens = new_tokens
+                    elif new_tokens:
+                        await self.save(new_tokens)
+                        tokens = new_tokens
+                    else:
+                        # Refresh failed, need to re-auth
+                        await self.clear()
+                        return None
+
+        self._cached_access = tokens.access_token
+        self._cached_exp = tokens.expires_at
         return tokens.access_token
 
     def is_authenticated(self) -> bool:
-        """Check if we have stored tokens."""
+        """Check if we have stored tokens (no disk access after startup)."""
         return self.load() is not None
 
 
@@ -1,10 +1,15 @@
 """Translate between OpenAI and Anthropic API formats."""
 
+import sys
+import time
+from types import MappingProxyType
 from typing import Any
 
+import orjson
+
 
 # Model mapping: OpenAI-style names to Anthropic model IDs
-MODEL_MAP = {
+_RAW_MODEL_MAP = {
     # Direct Anthropic models
     "claude-3-5-sonnet-20241022": "claude-3-5-sonnet-20241022",
     "claude-3-5-haiku-20241022": "claude-3-5-haiku-20241022",
@@ -20,11 +25,67 @@ MODEL_MAP = {
     "claude-sonnet": "claude-sonnet-4-20250514",
     "claude-opus": "claude-opus-4-20250514",
 }
+# Read-only view with interned strings, so lookups with interned names hit by identity
+MODEL_MAP = MappingProxyType({sys.intern(k): sys.intern(v) for k, v in _RAW_MODEL_MAP.items()})
+_MODEL_MAP_GET = MODEL_MAP.get
+
+
+# Anthropic stop_reason -> OpenAI finish_reason
+_FINISH_REASON_MAP = {
+    "end_turn": "stop",
+    "max_tokens": "length",
+    "stop_sequence": "stop",
+    "tool_use": "tool_calls",
+}
+_FINISH_REASON_GET = _FINISH_REASON_MAP.get
 
 
 def translate_model(openai_model: str) -> str:
     """Translate OpenAI model name to Anthropic model ID."""
-    return MODEL_MAP.get(openai_model, openai_model)
+    return _MODEL_MAP_GET(openai_model, openai_model)
+
+
+# OpenAI message roles, interned once at import
+_ROLE_SYSTEM = sys.intern("system")
+_ROLE_USER = sys.intern("user")
+_ROLE_ASSISTANT = sys.intern("assistant")
+_ROLE_TOOL = sys.intern("tool")
+
+
+def _add_system(msg: dict, messages: list[dict], system_parts: list[str]) -> None:
+    # Anthropic takes system as separate parameter
+    content = msg.get("content", "")
+    if content:
+        system_parts.append(content)
+
+
+def _add_user(msg: dict, messages: list[dict], system_parts: list[str]) -> None:
+    messages.append({"role": _ROLE_USER, "content": msg.get("content", "")})
+
+
+def _add_assistant(msg: dict, messages: list[dict], system_parts: list[str]) -> None:
+    messages.append({"role": _ROLE_ASSISTANT, "content": msg.get("content", "")})
+
+
+def _add_tool(msg: dict, messages: list[dict], system_parts: list[str]) -> None:
+    # Tool results in Anthropic format
+    messages.append({
+        "role": _ROLE_USER,
+        "content": [{
+            "type": "tool_result",
+            "tool_use_id": msg.get("tool_call_id", ""),
+            "content": msg.get("content", ""),
+        }],
+    })
+
+
+# OpenAI role -> handler that appends the translated message (or system text)
+_ROLE_HANDLERS = {
+    _ROLE_SYSTEM: _add_system,
+    _ROLE_USER: _add_user,
+    _ROLE_ASSISTANT: _add_assistant,
+    _ROLE_TOOL: _add_tool,
+}
 
 
 def openai_to_anthropic_messages(messages: list[dict]) -> tuple[str | None, list[dict]]:
@@ -34,34 +95,17 @@ def openai_to_anthropic_messages(messages: list[dict]) -> tuple[str | None, list
     Returns (system_prompt, messages) tuple.
     Anthropic requires system prompt separate from messages.
     """
-    system_prompt = None
-    anthropic_messages = []
+    system_parts: list[str] = []
+    anthropic_messages: list[dict] = []
 
+    # One hashed lookup per message; no per-role string comparisons
+    get_handler = _ROLE_HANDLERS.get
     for msg in messages:
-        role = msg.get("role", "")
-        content = msg.get("content", "")
-
-        if role == "system":
-            # Anthropic takes system as separate parameter
-            if system_prompt:
-                system_prompt += "\n\n" + content
-            else:
-                system_prompt = content
-        elif role == "user":
-            anthropic_messages.append({"role": "user", "content": content})
-        elif role == "assistant":
-            anthropic_messages.append({"role": "assistant", "content": content})
-        elif role == "tool":
-            # Tool results in Anthropic format
-            anthropic_messages.append({
-                "role": "user",
-                "content": [{
-                    "type": "tool_result",
-                    "tool_use_id": msg.get("tool_call_id", ""),
-                    "content": content,
-                }],
-            })
+        handler = get_handler(msg.get("role", ""))
+        if handler:
+            handler(msg, anthropic_messages, system_parts)
 
+    system_prompt = "\n\n".join(system_parts) if system_parts else None
     return system_prompt, anthropic_messages
 
 
@@ -70,19 +114,26 @@ def openai_to_anthropic_tools(tools: list[dict] | None) -> list[dict] | None:
     if not tools:
         return None
 
-    anthropic_tools = []
-    for tool in tools:
-        if tool.get("type") != "function":
-            continue
-
-        func = tool.get("function", {})
-        anthropic_tools.append({
+    anthropic_tools = [
+        {
             "name": func.get("name", ""),
             "description": func.get("description", ""),
             "input_schema": func.get("parameters", {}),
-        })
+        }
+        for tool in tools
+        if tool.get("type") == "function"
+        for func in (tool.get("function", {}),)
+    ]
+    return anthropic_tools or None
 
-    return anthropic_tools if anthropic_tools else None
+
+_MISSING = object()
+
+# (openai_key, anthropic_key, transform) for request parameters copied as-is
+_PASSTHROUGH_PARAMS = (
+    ("temperature", "temperature", None),  # Anthropic uses 0-1 range like OpenAI
+    ("top_p", "top_p", None),
+)
 
 
 def openai_to_anthropic_request(openai_request: dict) -> dict:
@@ -96,29 +147,30 @@ def openai_to_anthropic_request(openai_request: dict) -> dict:
         "max_tokens": openai_request.get("max_tokens", 4096),
     }
 
-    # Add system prompt if present
+    # Add system prompt if present, marked as a cacheable prefix for Anthropic prompt caching
     if system_prompt:
-        anthropic_request["system"] = system_prompt
-
-    # Temperature (Anthropic uses 0-1 range like OpenAI)
-    if "temperature" in openai_request:
-        anthropic_request["temperature"] = openai_request["temperature"]
+        anthropic_request["system"] = [
+            {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+        ]
 
-    # Top P
-    if "top_p" in openai_request:
-        anthropic_request["top_p"] = openai_request["top_p"]
+    # Sampling parameters copied in a single pass over the passthrough table
+    for src, dst, transform in _PASSTHROUGH_PARAMS:
+        value = openai_request.get(src, _MISSING)
+        if value is not _MISSING:
+            anthropic_request[dst] = transform(value) if transform else value
 
     # Stop sequences
-    if "stop" in openai_request:
-        stop = openai_request["stop"]
-        if isinstance(stop, str):
-            anthropic_request["stop_sequences"] = [stop]
-        elif isinstance(stop, list):
-            anthropic_request["stop_sequences"] = stop
+    stop = openai_request.get("stop")
+    if isinstance(stop, str):
+        anthropic_request["stop_sequences"] = [stop]
+    elif isinstance(stop, list):
+        anthropic_request["stop_sequences"] = stop
 
     # Tools
     tools = openai_to_anthropic_tools(openai_request.get("tools"))
     if tools:
+        # Cache breakpoint on the last tool caches the whole (stable) tool list
+        tools[-1]["cache_control"] = {"type": "ephemeral"}
         anthropic_request["tools"] = tools
 
     # Stream
@@ -133,15 +185,17 @@ def anthropic_to_openai_response(anthropic_response: dict, model: str) -> dict:
     content_blocks = anthropic_response.get("content", [])
 
     # Extract text content and tool calls
-    text_content = ""
+    text_parts: list[str] = []
     tool_calls = []
 
-    for i, block in enumerate(content_blocks):
-        if block.get("type") == "text":
-            text_content += block.get("text", "")
-        elif block.get("type") == "tool_use":
+    for block in content_blocks:
+        block_type = block.get("type")
+        if block_type == "text":
+            text_parts.append(block.get("text", ""))
+        elif block_type == "tool_use":
             tool_calls.append({
-                "id": block.get("id", f"call_{i}"),
+                # Fallback ids count tool calls only, so other blocks don't leave gaps
+                "id": block.get("id") or f"call_{len(tool_calls)}",
                 "type": "function",
                 "function": {
                     "name": block.get("name", ""),
@@ -149,6 +203,8 @@ def anthropic_to_openai_response(anthropic_response: dict, model: str) -> dict:
                 },
             })
 
+    text_content = "".join(text_parts)
+
     # Build OpenAI-style message
     message: dict[str, Any] = {
         "role": "assistant",
@@ -160,26 +216,22 @@ def anthropic_to_openai_response(anthropic_response: dict, model: str) -> dict:
 
     # Map finish reason
     stop_reason = anthropic_response.get("stop_reason", "end_turn")
-    finish_reason_map = {
-        "end_turn": "stop",
-        "max_tokens": "length",
-        "stop_sequence": "stop",
-        "tool_use": "tool_calls",
-    }
-    finish_reason = finish_reason_map.get(stop_reason, "stop")
+    finish_reason = _FINISH_REASON_GET(stop_reason, "stop")
 
     # Build usage
-    usage = anthropic_response.get("usage", {})
+    usage = anthropic_response.get("usage") or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
     openai_usage = {
-        "prompt_tokens": usage.get("input_tokens", 0),
-        "completion_tokens": usage.get("output_tokens", 0),
-        "total_tokens": usage.get("input_tokens", 0) + usage.get("output_tokens", 0),
+        "prompt_tokens": input_tokens,
+        "completion_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
     }
 
     return {
         "id": anthropic_response.get("id", "chatcmpl-anthropic"),
         "object": "chat.completion",
-        "created": int(__import__("time").time()),
+        "created": int(time.time()),
         "model": model,
         "choices": [{
             "index": 0,
@@ -190,115 +242,96 @@ def anthropic_to_openai_response(anthropic_response: dict, model: str) -> dict:
     }
 
 
-def anthropic_stream_to_openai_stream(event_type: str, data: dict, model: str) -> dict | None:
-    """Convert Anthropic streaming event to OpenAI SSE format."""
+# Anthropic stream events that can produce an OpenAI chunk; all others (ping,
+# content_block_stop, ...) are dropped without decoding their payload
+STREAM_OUTPUT_EVENTS = frozenset({
+    "message_start",
+    "content_block_start",
+    "content_block_delta",
+    "message_delta",
+    "message_stop",
+})
+
+
+def _chunk(
+    created: int,
+    model: str,
+    delta: dict,
+    finish_reason: str | None = None,
+    id_: str = "chatcmpl-anthropic",
+) -> dict:
+    """Build an OpenAI ``chat.completion.chunk`` envelope around a delta."""
+    return {
+        "id": id_,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def anthropic_stream_to_openai_stream(
+    event_type: str, data: dict, model: str, created: int
+) -> dict | None:
+    """Convert Anthropic streaming event to OpenAI SSE format.
+
+    ``model`` and ``created`` are computed once when the stream opens and shared by
+    all its chunks; ``model`` is echoed as-is (no per-chunk translation).
+    """
     if event_type == "message_start":
-        return {
-            "id": data.get("message", {}).get("id", "chatcmpl-anthropic"),
-            "object": "chat.completion.chunk",
-            "created": int(__import__("time").time()),
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {"role": "assistant", "content": ""},
-                "finish_reason": None,
-            }],
-        }
+        return _chunk(
+            created,
+            model,
+            {"role": "assistant", "content": ""},
+            id_=data.get("message", {}).get("id", "chatcmpl-anthropic"),
+        )
 
     elif event_type == "content_block_delta":
         delta = data.get("delta", {})
         if delta.get("type") == "text_delta":
-            return {
-                "id": "chatcmpl-anthropic",
-                "object": "chat.completion.chunk",
-                "created": int(__import__("time").time()),
-                "model": model,
-                "choices": [{
-                    "index": 0,
-                    "delta": {"content": delta.get("text", "")},
-                    "finish_reason": None,
-                }],
-            }
+            return _chunk(created, model, {"content": delta.get("text", "")})
         elif delta.get("type") == "input_json_delta":
             # Tool call argument streaming
-            return {
-                "id": "chatcmpl-anthropic",
-                "object": "chat.completion.chunk",
-                "created": int(__import__("time").time()),
-                "model": model,
-                "choices": [{
-                    "index": 0,
-                    "delta": {
-                        "tool_calls": [{
-                            "index": data.get("index", 0),
-                            "function": {"arguments": delta.get("partial_json", "")},
-                        }]
-                    },
-                    "finish_reason": None,
-                }],
-            }
+            return _chunk(created, model, {
+                "tool_calls": [{
+                    "index": data.get("index", 0),
+                    "function": {"arguments": delta.get("partial_json", "")},
+                }]
+            })
 
     elif event_type == "content_block_start":
         block = data.get("content_block", {})
         if block.get("type") == "tool_use":
-            return {
-                "id": "chatcmpl-anthropic",
-                "object": "chat.completion.chunk",
-                "created": int(__import__("time").time()),
-                "model": model,
-                "choices": [{
-                    "index": 0,
-                    "delta": {
-                        "tool_calls": [{
-                            "index": data.get("index", 0),
-                            "id": block.get("id", ""),
-                            "type": "function",
-                            "function": {"name": block.get("name", ""), "arguments": ""},
-                        }]
-                    },
-                    "finish_reason": None,
-                }],
-            }
+            return _chunk(created, model, {
+                "tool_calls": [{
+                    "index": data.get("index", 0),
+                    "id": block.get("id", ""),
+                    "type": "function",
+                    "function": {"name": block.get("name", ""), "arguments": ""},
+                }]
+            })
 
     elif event_type == "message_delta":
-        delta = data.get("delta", {})
-        stop_reason = delta.get("stop_reason")
+        stop_reason = data.get("delta", {}).get("stop_reason")
         if stop_reason:
-            finish_reason_map = {
-                "end_turn": "stop",
-                "max_tokens": "length",
-                "stop_sequence": "stop",
-                "tool_use": "tool_calls",
-            }
-            return {
-                "id": "chatcmpl-anthropic",
-                "object": "chat.completion.chunk",
-                "created": int(__import__("time").time()),
-                "model": model,
-                "choices": [{
-                    "index": 0,
-                    "delta": {},
-                    "finish_reason": finish_reason_map.get(stop_reason, "stop"),
-                }],
-            }
+            return _chunk(created, model, {}, _FINISH_REASON_GET(stop_reason, "stop"))
 
     elif event_type == "message_stop":
-        return {
-            "id": "chatcmpl-anthropic",
-            "object": "chat.completion.chunk",
-            "created": int(__import__("time").time()),
-            "model": model,
-            "choices": [{
-                "index": 0,
-                "delta": {},
-                "finish_reason": "stop",
-            }],
-        }
+        return _chunk(created, model, {}, "stop")
 
     return None
 
 
+def anthropic_stream_to_openai_stream_bytes(
+    event_type: str, data: dict, model: str, created: int
+) -> bytes | None:
+    """Like anthropic_stream_to_openai_stream, but return a ready-to-send SSE frame."""
+    chunk = anthropic_stream_to_openai_stream(event_type, data, model, created)
+    if chunk is None:
+        return None
+    return b"data: " + orjson.dumps(chunk) + b"\n\n"
+
+
 def _serialize_json(obj: Any) -> str:
     """Serialize object to JSON string."""
-    import json
-    return json.dumps(obj)
+    return orjson.dumps(obj).decode()